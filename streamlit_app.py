@@ -1,10 +1,30 @@
+import altair as alt
 import streamlit as st
 import pandas as pd
 import numpy as np
+import importlib.util
+import io
 import os
 from datetime import date, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+from functools import lru_cache
+from types import SimpleNamespace
+
+@lru_cache(maxsize=1)
+def _mpl():
+    # matplotlib n'est importé qu'au premier vrai tracé (défaut du cache PNG
+    # du semainier), pas au démarrage de l'appli.
+    import matplotlib
+    matplotlib.use("Agg")  # rendu hors écran, pas de sonde de backend interactif
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection, PatchCollection
+    from matplotlib.colors import to_rgba
+    from matplotlib.patches import Rectangle
+    return SimpleNamespace(plt=plt, Rectangle=Rectangle, LineCollection=LineCollection,
+                           PatchCollection=PatchCollection, to_rgba=to_rgba)
+
+# Détection sans import : gspread + google-auth tirent ~30 modules, qu'on ne
+# paie qu'à la première connexion Sheets (dans les fabriques cache_resource).
+_HAS_GSPREAD = importlib.util.find_spec("gspread") is not None
 
 st.set_page_config(page_title="📒 Suivi TDAH", layout="wide")
 
@@ -21,42 +41,111 @@ COLUMNS = [
     "journee_durete", "commentaire",
 ]
 
+COL_POS = {c: i for i, c in enumerate(COLUMNS)}
+
+# Dtypes explicites pour le CSV : évite l'inférence de type colonne par colonne
+# à chaque lecture (entiers nullables pour tolérer les cases vides).
+CSV_DTYPES = {
+    "dose_8h": "Int16", "dose_13h": "Int16", "dose_16h": "Int16",
+    "efficacite_matin": "Int8", "efficacite_apresmidi": "Int8", "efficacite_soir": "Int8",
+    "nb_patients": "Int16", "nouveaux_patients": "Int16", "journee_durete": "Int8",
+}
+
+# Alphabet fermé du formulaire ; sert aussi de base aux catégories de la colonne.
+SPORT_TYPES = ["Musculation", "Natation", "Course", "Volley", "Autre"]
+
+NUM_COLS = [
+    "nb_patients", "nouveaux_patients", "dose_8h", "dose_13h", "dose_16h",
+    "efficacite_matin", "efficacite_apresmidi", "efficacite_soir", "journee_durete",
+]
+
+# Colonnes texte libres ou HH:MM : normalisées sans NaN au chargement pour
+# que les boucles de rendu manipulent des str purs.
+TEXT_COLS = [
+    c for c in COLUMNS
+    if c not in NUM_COLS and c not in ("date", "travail_aprem", "sport", "type_sport")
+]
+
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 CSV_PATH = os.path.join(DATA_DIR, "journal.csv")
+PARQUET_PATH = os.path.join(DATA_DIR, "journal.parquet")
 
 def ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Court-circuit : schéma et dtypes déjà conformes (cas courant après un
+    # chargement Parquet ou un aller-retour load/save), rien à refaire.
+    if (list(df.columns) == COLUMNS
+            and pd.api.types.is_datetime64_any_dtype(df["date"])
+            and df["travail_aprem"].dtype == bool and df["sport"].dtype == bool
+            and isinstance(df["type_sport"].dtype, pd.CategoricalDtype)
+            and all(pd.api.types.is_numeric_dtype(df[c]) for c in NUM_COLS)):
+        return df
+    have = frozenset(df.columns)
     for c in COLUMNS:
-        if c not in df.columns:
+        if c not in have:
             df[c] = np.nan
-    for col in ["nb_patients","nouveaux_patients","dose_8h","dose_13h","dose_16h",
-                "efficacite_matin","efficacite_apresmidi","efficacite_soir","journee_durete"]:
-        if col in df.columns:
+    # Dates en datetime64 en interne : les filtres (semaine, période d'analyse)
+    # deviennent des comparaisons numériques au lieu de comparaisons de chaînes.
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    # Booléens réels : plus de `str(...).lower() in [...]` dans les boucles de rendu.
+    for col in ("travail_aprem", "sport"):
+        if df[col].dtype != bool:
+            df[col] = df[col].astype(str).str.lower().isin(("true", "1", "yes"))
+    # Catégoriel : un code int8 par valeur au lieu d'une chaîne Python par ligne.
+    # Les catégories du formulaire sont garanties présentes pour que l'upsert
+    # puisse toujours écrire la valeur choisie.
+    if not isinstance(df["type_sport"].dtype, pd.CategoricalDtype):
+        df["type_sport"] = df["type_sport"].astype("category")
+        missing = [c for c in SPORT_TYPES + [""] if c not in df["type_sport"].cat.categories]
+        if missing:
+            df["type_sport"] = df["type_sport"].cat.add_categories(missing)
+    for col in NUM_COLS:
+        if not pd.api.types.is_numeric_dtype(df[col]):
             df[col] = pd.to_numeric(df[col], errors="coerce")
-    return df[COLUMNS]
+    for col in ("dose_8h", "dose_13h", "dose_16h"):
+        if df[col].dtype != "Int8":
+            df[col] = df[col].round().astype("Int8")
+    # Texte sans NaN : plus de str(x or "") défensif cellule par cellule en aval.
+    for col in TEXT_COLS:
+        if df[col].isna().any():
+            df[col] = df[col].fillna("")
+    if df["type_sport"].isna().any():
+        df["type_sport"] = df["type_sport"].fillna("")
+    if list(df.columns) != COLUMNS:
+        df = df[COLUMNS]
+    return df
 
 # ===================== Google Sheets (si dispo) =====================
-USE_SHEETS = ("gcp_service_account" in st.secrets) and ("sheets" in st.secrets)
+USE_SHEETS = _HAS_GSPREAD and ("gcp_service_account" in st.secrets) and ("sheets" in st.secrets)
 
 if USE_SHEETS:
-    import gspread
-    from google.oauth2.service_account import Credentials
-
     SCOPE = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
     ]
-    CREDS = Credentials.from_service_account_info(
-        dict(st.secrets["gcp_service_account"]), scopes=SCOPE
-    )
-    GC = gspread.authorize(CREDS)
     SHEET_NAME = st.secrets["sheets"].get("sheet_name", "Journal TDAH")
 
+    @st.cache_resource(show_spinner=False)
+    def _gspread_client():
+        # Authentification faite une seule fois par session, pas à chaque rerun.
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        creds = Credentials.from_service_account_info(
+            dict(st.secrets["gcp_service_account"]), scopes=SCOPE
+        )
+        return gspread.authorize(creds)
+
+    @st.cache_resource(show_spinner=False)
     def _open_or_create_ws():
+        import gspread
+
+        gc = _gspread_client()
         try:
-            sh = GC.open(SHEET_NAME)
+            sh = gc.open(SHEET_NAME)
         except gspread.SpreadsheetNotFound:
-            sh = GC.create(SHEET_NAME)
+            sh = gc.create(SHEET_NAME)
         try:
             ws = sh.worksheet("data")
         except gspread.WorksheetNotFound:
@@ -64,39 +153,128 @@ if USE_SHEETS:
             ws.append_row(COLUMNS)
         return sh, ws
 
+    def _ws_retry(op):
+        # Une poignée en cache ne peut devenir invalide qu'à l'usage (feuille
+        # supprimée, jeton expiré…) : c'est donc l'opération elle-même qu'on
+        # retente une fois, après purge des ressources, sur une poignée neuve.
+        try:
+            return op(_open_or_create_ws()[1])
+        except Exception:
+            _open_or_create_ws.clear()
+            _gspread_client.clear()
+            return op(_open_or_create_ws()[1])
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_sheets() -> pd.DataFrame:
+    # get_all_values : listes brutes, sans le dict par ligne (clés d'en-tête
+    # répétées) que construit get_all_records.
+    rows = _ws_retry(lambda ws: ws.get_all_values())
+    if len(rows) < 2:
+        return pd.DataFrame(columns=COLUMNS)
+    header, *data = rows
+    return pd.DataFrame(data, columns=header)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_parquet(path: str, mtime: float) -> pd.DataFrame:
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return pd.DataFrame(columns=COLUMNS)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_csv(path: str, mtime: float) -> pd.DataFrame:
+    # mtime fait partie de la clé de cache : toute écriture invalide l'entrée.
+    if mtime == 0.0:
+        return pd.DataFrame(columns=COLUMNS)
+    try:
+        # Lecture par tranches : le pic mémoire du parseur reste borné par la
+        # tranche, pas par l'historique complet ; une seule concaténation à la fin.
+        with pd.read_csv(path, dtype=CSV_DTYPES, usecols=lambda c: c in COL_POS,
+                         chunksize=2000) as reader:
+            chunks = list(reader)
+        if not chunks:
+            return pd.DataFrame(columns=COLUMNS)
+        return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+    except Exception:
+        return pd.DataFrame(columns=COLUMNS)
+
+def _clear_data_caches():
+    _load_parquet.clear()
+    _load_csv.clear()
+    _load_sheets.clear()
+
 def load_data() -> pd.DataFrame:
     if USE_SHEETS:
         try:
-            _, ws = _open_or_create_ws()
-            records = ws.get_all_records()
-            df = pd.DataFrame(records) if records else pd.DataFrame(columns=COLUMNS)
-            return ensure_columns(df)
+            df = ensure_columns(_load_sheets())
+            # Seul un frame issu de la feuille a des positions alignées sur
+            # ses lignes : save_data s'en sert pour autoriser l'écriture ciblée.
+            df.attrs["source"] = "sheets"
+            return df
         except Exception as e:
-            st.warning(f"⚠️ Google Sheets indisponible ({e}). Passage en CSV local.")
-    if os.path.exists(CSV_PATH):
-        try:
-            df = pd.read_csv(CSV_PATH)
-        except Exception:
-            df = pd.DataFrame(columns=COLUMNS)
-    else:
-        df = pd.DataFrame(columns=COLUMNS)
-    return ensure_columns(df)
-
-def save_data(df: pd.DataFrame) -> str:
-    df = ensure_columns(df.copy())
+            st.warning(f"⚠️ Google Sheets indisponible ({e}). Passage au stockage local.")
+    if os.path.exists(PARQUET_PATH):
+        return ensure_columns(_load_parquet(PARQUET_PATH, os.path.getmtime(PARQUET_PATH)))
+    # Héritage : ancien journal CSV, converti en Parquet au prochain enregistrement.
+    mtime = os.path.getmtime(CSV_PATH) if os.path.exists(CSV_PATH) else 0.0
+    return ensure_columns(_load_csv(CSV_PATH, mtime))
+
+def save_data(df: pd.DataFrame, row_idx=None, is_new=False) -> str:
+    # Pas de df.copy() : ensure_columns ne réordonne que si nécessaire et les
+    # écritures en aval ne modifient pas le DataFrame.
+    in_sheet_order = df.attrs.get("source") == "sheets"
+    df = ensure_columns(df)
     if USE_SHEETS:
         try:
-            _, ws = _open_or_create_ws()
-            ws.clear()
-            ws.append_row(COLUMNS)
-            if not df.empty:
-                values = df.fillna("").astype(str).values.tolist()
-                ws.append_rows(values)
+            if row_idx is not None and not in_sheet_order:
+                # Frame chargé du stockage local (Sheets indisponible au
+                # chargement) : ses positions ne correspondent pas aux lignes
+                # de la feuille. Réécriture complète plutôt que d'écraser la
+                # mauvaise ligne ou d'ajouter un doublon de date.
+                row_idx = None
+            sdf = df if row_idx is None else df.iloc[[row_idx]]
+            sdf = sdf.assign(date=sdf["date"].dt.strftime("%Y-%m-%d"))
+            # itertuples évite la matérialisation object de astype(str) ; les
+            # flottants/booléens partent tels quels (sérialisables en JSON),
+            # seul le reste est converti en chaîne.
+            values = [
+                ["" if pd.isna(v)
+                 else float(v) if isinstance(v, float)
+                 else bool(v) if isinstance(v, (bool, np.bool_))
+                 else str(v)
+                 for v in row]
+                for row in sdf.itertuples(index=False, name=None)
+            ]
+            if row_idx is not None and is_new:
+                # Nouvelle journée : append_row étend la feuille au besoin,
+                # pas de plafond lié au nombre de lignes créées au départ.
+                _ws_retry(lambda ws: ws.append_row(values[0], value_input_option="RAW"))
+            elif row_idx is not None:
+                # Écriture ciblée : une seule requête HTTP pour la ligne modifiée
+                # (+1 pour l'en-tête, +1 pour l'indexation A1).
+                _ws_retry(lambda ws: ws.update(f"A{row_idx + 2}", values, value_input_option="RAW"))
+            else:
+                def _rewrite(ws):
+                    # La feuille peut compter plus de lignes que le frame :
+                    # purge d'abord pour ne pas laisser de queue obsolète.
+                    ws.clear()
+                    ws.update("A1", [COLUMNS] + values, value_input_option="RAW")
+                _ws_retry(_rewrite)
+            _clear_data_caches()
             return "sheets"
         except Exception as e:
-            st.error(f"Erreur écriture Google Sheets : {e}. Données sauvegardées en CSV local.")
-    df.to_csv(CSV_PATH, index=False)
-    return "csv"
+            st.error(f"Erreur écriture Google Sheets : {e}. Données sauvegardées en local.")
+    try:
+        # Parquet : types préservés, lecture/écriture nettement plus rapides que le CSV.
+        df.to_parquet(PARQUET_PATH, index=False)
+        _clear_data_caches()
+        return "parquet"
+    except Exception:
+        # Gros tampon d'écriture : une poignée de write() au lieu d'un par bloc de lignes.
+        with open(CSV_PATH, "w", buffering=1 << 20, newline="") as f:
+            df.to_csv(f, index=False, lineterminator="\n", date_format="%Y-%m-%d")
+        _clear_data_caches()
+        return "csv"
 
 # ===================== Helpers =====================
 def week_monday(d: date) -> date:
@@ -107,13 +285,16 @@ def week_days_for(any_day: date):
     return [start + timedelta(days=i) for i in range(7)]
 
 def hhmm_to_hour(hhmm: str):
-    if not isinstance(hhmm, str) or not hhmm:
+    # Parse « HH:MM » (ou « HH:MM:SS ») sans split ni allocation de liste :
+    # appelé des dizaines de fois par rendu du semainier.
+    if not isinstance(hhmm, str):
+        return np.nan
+    i = hhmm.find(":")
+    if i <= 0:
         return np.nan
     try:
-        parts = hhmm.split(":")
-        hh, mm = int(parts[0]), int(parts[1])
-        return hh + mm / 60.0
-    except Exception:
+        return int(hhmm[:i]) + int(hhmm[i + 1:i + 3]) / 60.0
+    except ValueError:
         return np.nan
 
 def parse_duration_hmin(txt: str):
@@ -133,6 +314,30 @@ def parse_duration_hmin(txt: str):
         return np.nan
     return np.nan
 
+def _hhmm_series_to_hours(s: pd.Series) -> np.ndarray:
+    # Équivalent vectorisé de hhmm_to_hour : un seul str.extract C-level
+    # pour toute la colonne, NaN pour ce qui ne ressemble pas à HH:MM.
+    parts = s.astype(str).str.extract(r"^(\d{1,2}):(\d{2})")
+    return (parts[0].astype(float) + parts[1].astype(float) / 60.0).to_numpy()
+
+def hours_worked_vec(df: pd.DataFrame) -> np.ndarray:
+    m1 = _hhmm_series_to_hours(df["travail_debut"])
+    m2 = _hhmm_series_to_hours(df["pause_dej"])
+    a1 = _hhmm_series_to_hours(df["reprise_aprem"])
+    a2 = _hhmm_series_to_hours(df["fin_travail"])
+    morning = np.where(m2 > m1, m2 - m1, 0.0)
+    aprem = df["travail_aprem"].to_numpy(dtype=bool)
+    afternoon = np.where(aprem & (a2 > a1), a2 - a1, 0.0)
+    total = morning + afternoon
+    return np.where(total > 0, total, np.nan)
+
+def parse_duration_series(s: pd.Series) -> pd.Series:
+    # Équivalent vectorisé de parse_duration_hmin pour toute une colonne.
+    cleaned = s.astype(str).str.lower().str.replace(" ", "", regex=False)
+    parts = cleaned.str.extract(r"^(?:(\d+)h)?(?:(\d+)min)?")
+    hours, mins = parts[0].astype(float), parts[1].astype(float)
+    return (hours.fillna(0) + mins.fillna(0) / 60.0).where(hours.notna() | mins.notna())
+
 def hours_worked(row):
     m1 = hhmm_to_hour(row.get("travail_debut"))
     m2 = hhmm_to_hour(row.get("pause_dej"))
@@ -141,36 +346,43 @@ def hours_worked(row):
     total = 0.0
     if not np.isnan(m1) and not np.isnan(m2) and m2 > m1:
         total += (m2 - m1)
-    if str(row.get("travail_aprem")).lower() in ["true","1","yes"]:
+    if row.get("travail_aprem"):
         if not np.isnan(a1) and not np.isnan(a2) and a2 > a1:
             total += (a2 - a1)
     return total if total > 0 else np.nan
 
-def avg_efficacy(row):
-    vals = [row.get("efficacite_matin"), row.get("efficacite_apresmidi"), row.get("efficacite_soir")]
-    vals = [v for v in vals if pd.notnull(v)]
-    return float(np.mean(vals)) if vals else np.nan
+def compute_metrics(dfa: pd.DataFrame) -> pd.DataFrame:
+    # Une seule passe pour les trois colonnes dérivées de l'analyse.
+    return dfa.assign(
+        sleep_h=parse_duration_series(dfa["duree_sommeil"]),
+        work_h=hours_worked_vec(dfa),
+        eff_avg=dfa[["efficacite_matin", "efficacite_apresmidi", "efficacite_soir"]].mean(axis=1),
+    )
 
-def draw_block(ax, day_idx, h_start, h_end, color, label=None, alpha=0.3):
-    if any(map(np.isnan, [h_start, h_end])) or (h_end <= h_start):
+# Les rectangles sont accumulés dans des listes (patch, couleur RGBA) puis
+# ajoutés en une seule PatchCollection : add_patch artiste par artiste est
+# le poste dominant de la construction de la figure.
+def draw_block(ax, patches, facecolors, day_idx, h_start, h_end, color, label=None, alpha=0.3):
+    # x != x : test NaN sur floats purs, sans dispatch NumPy par appel.
+    if h_start != h_start or h_end != h_end or h_end <= h_start:
         return
+    mpl = _mpl()
     x0, x1 = day_idx + 0.08, day_idx + 1 - 0.08
-    rect = Rectangle((x0, h_start), x1 - x0, max(0.06, h_end - h_start),
-                     facecolor=color, edgecolor=color, alpha=alpha)
-    ax.add_patch(rect)
+    patches.append(mpl.Rectangle((x0, h_start), x1 - x0, max(0.06, h_end - h_start)))
+    facecolors.append(mpl.to_rgba(color, alpha))
     if label:
         ax.text((x0 + x1) / 2, (h_start + h_end) / 2, label,
                 ha="center", va="center", fontsize=9, color=color)
 
-def draw_med(ax, day_idx, hour_val, dose):
-    if np.isnan(hour_val):
+def draw_med(ax, patches, facecolors, day_idx, hour_val, dose):
+    if hour_val != hour_val:
         return
+    mpl = _mpl()
     x0, x1 = day_idx + 0.10, day_idx + 1 - 0.10
     tag_w = (x1 - x0) * 0.28
     ax.plot([x0, x1 - tag_w - 0.01], [hour_val, hour_val], color="blue", linewidth=2)
-    rect = Rectangle((x1 - tag_w, hour_val - 0.3), tag_w, 0.6,
-                     facecolor="blue", edgecolor="blue", alpha=0.95)
-    ax.add_patch(rect)
+    patches.append(mpl.Rectangle((x1 - tag_w, hour_val - 0.3), tag_w, 0.6))
+    facecolors.append(mpl.to_rgba("blue", 0.95))
     txt = f"{dose} mg" if str(dose).strip() else "dose"
     ax.text(x1 - tag_w / 2, hour_val, txt, color="white", fontsize=8, ha="center", va="center")
 
@@ -186,8 +398,11 @@ with top1:
 with top2:
     if USE_SHEETS and st.button("Tester la connexion Sheets"):
         try:
-            sh, ws = _open_or_create_ws()
-            st.success(f"Connexion OK → Feuille: **{SHEET_NAME}** / Onglet: **{ws.title}**")
+            def _probe(ws):
+                ws.row_values(1)  # vraie requête : teste la poignée de bout en bout
+                return ws.title
+            tab = _ws_retry(_probe)
+            st.success(f"Connexion OK → Feuille: **{SHEET_NAME}** / Onglet: **{tab}**")
         except Exception as e:
             st.error(f"Connexion KO : {e}")
 
@@ -202,25 +417,36 @@ with st.form("journal_form"):
     duree_sommeil = st.text_input("Durée du sommeil (ex: 7h45)")
 
     st.subheader("💊 Prises du traitement")
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        prise_8h = st.time_input("Heure prise 8h", value=None, key="p8")
-        dose_8h = st.selectbox("Dose matin (mg)", [10, 20, 30], key="d8")
-        eff_matin = st.slider("Efficacité matin (0–10)", 0, 10, 6, key="e_matin")
-        note_matin = st.text_area("Notes matin", key="n_matin")
-        effets_matin = st.text_area("Effets indésirables matin", key="ei_matin")
-    with c2:
-        prise_13h = st.time_input("Heure prise 13h", value=None, key="p13")
-        dose_13h = st.selectbox("Dose midi (mg)", [10, 20, 30], index=1, key="d13")
-        eff_apm = st.slider("Efficacité après-midi (0–10)", 0, 10, 6, key="e_apm")
-        note_apm = st.text_area("Notes après-midi", key="n_apm")
-        effets_apm = st.text_area("Effets indésirables après-midi", key="ei_apm")
-    with c3:
-        prise_16h = st.time_input("Heure prise 16h", value=None, key="p16")
-        dose_16h = st.selectbox("Dose après-midi (mg)", [10, 20, 30], key="d16")
-        eff_soir = st.slider("Efficacité soir (0–10)", 0, 10, 6, key="e_soir")
-        note_soir = st.text_area("Notes soir", key="n_soir")
-        effets_soir = st.text_area("Effets indésirables soir", key="ei_soir")
+    # Un seul data_editor (édité côté client) remplace les quinze widgets
+    # matin/après-midi/soir : un seul identifiant de widget à hacher et à
+    # synchroniser par rerun au lieu de quinze.
+    # RangeIndex + libellés dans une colonne désactivée : un index de chaînes
+    # fait perdre les colonnes entières nullables à l'aller-retour Arrow du
+    # data_editor (elles reviennent toutes à NA) ; d'où aussi les int64 bruts.
+    meds = st.data_editor(
+        pd.DataFrame(
+            {
+                "moment": ["Matin (8h)", "Après-midi (13h)", "Soir (16h)"],
+                "prise": pd.Series([None, None, None], dtype=object),
+                "dose": [10, 20, 10],
+                "efficacite": [6, 6, 6],
+                "note": ["", "", ""],
+                "effets": ["", "", ""],
+            },
+        ),
+        key="meds",
+        num_rows="fixed",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "moment": st.column_config.TextColumn("Moment", disabled=True),
+            "prise": st.column_config.TimeColumn("Heure de prise"),
+            "dose": st.column_config.SelectboxColumn("Dose (mg)", options=[10, 20, 30], required=True),
+            "efficacite": st.column_config.NumberColumn("Efficacité (0–10)", min_value=0, max_value=10, step=1, required=True),
+            "note": st.column_config.TextColumn("Notes"),
+            "effets": st.column_config.TextColumn("Effets indésirables"),
+        },
+    )
 
     st.subheader("💼 Travail")
     travail_debut = st.text_input("Heure début (ex: 09:00)")
@@ -234,10 +460,7 @@ with st.form("journal_form"):
     st.subheader("🏃 Sport")
     sport = st.checkbox("J'ai fait du sport", key="sport_chk")
     # Champs TOUJOURS éditables ; on les videra si non coché
-    type_sport = st.selectbox(
-        "Type de sport", ["Musculation", "Natation", "Course", "Volley", "Autre"],
-        key="type_sport"
-    )
+    type_sport = st.selectbox("Type de sport", SPORT_TYPES, key="type_sport")
     heure_sport = st.text_input("Heure de l'entraînement (ex: 19:00)", key="heure_sport")
     duree_sport = st.text_input("Durée (ex: 45min / 1h15)", key="duree_sport")
 
@@ -250,67 +473,105 @@ with st.form("journal_form"):
     if submitted:
         if not sport:
             type_sport, heure_sport, duree_sport = "", "", ""
-        new = {
-            "date": str(d),
-            "heure_couche": heure_couche, "duree_sommeil": duree_sommeil,
-            "prise_8h": str(prise_8h) if prise_8h else "", "dose_8h": int(dose_8h),
-            "efficacite_matin": int(eff_matin), "note_matin": note_matin, "effets_matin": effets_matin,
-            "prise_13h": str(prise_13h) if prise_13h else "", "dose_13h": int(dose_13h),
-            "efficacite_apresmidi": int(eff_apm), "note_apresmidi": note_apm, "effets_apresmidi": effets_apm,
-            "prise_16h": str(prise_16h) if prise_16h else "", "dose_16h": int(dose_16h),
-            "efficacite_soir": int(eff_soir), "note_soir": note_soir, "effets_soir": effets_soir,
-            "travail_debut": travail_debut, "pause_dej": pause_dej, "travail_aprem": bool(travail_aprem),
-            "reprise_aprem": reprise_aprem, "fin_travail": fin_travail,
-            "nb_patients": int(nb_patients), "nouveaux_patients": int(nouveaux_patients),
-            "sport": bool(sport), "type_sport": type_sport, "heure_sport": heure_sport, "duree_sport": duree_sport,
-            "journee_durete": int(journee_durete), "commentaire": commentaire
-        }
-        if (df["date"] == new["date"]).any():
-            df.loc[df["date"] == new["date"], :] = pd.DataFrame([new])
+        def _med_vals(r):
+            return [str(r["prise"]) if r["prise"] else "",
+                    int(r["dose"]) if pd.notna(r["dose"]) else 10,
+                    int(r["efficacite"]) if pd.notna(r["efficacite"]) else 6,
+                    r["note"] if pd.notna(r["note"]) else "",
+                    r["effets"] if pd.notna(r["effets"]) else ""]
+        # Ligne construite positionnellement, dans l'ordre exact de COLUMNS.
+        row_vals = [
+            pd.Timestamp(d),
+            heure_couche, duree_sommeil,
+            *_med_vals(meds.iloc[0]), *_med_vals(meds.iloc[1]), *_med_vals(meds.iloc[2]),
+            travail_debut, pause_dej, bool(travail_aprem), reprise_aprem, fin_travail,
+            int(nb_patients), int(nouveaux_patients),
+            bool(sport), type_sport, heure_sport, duree_sport,
+            int(journee_durete), commentaire,
+        ]
+        hits = np.flatnonzero(df["date"].values == row_vals[COL_POS["date"]].to_datetime64())
+        if hits.size:
+            # Écriture positionnelle d'un coup : pas de hachage de noms de
+            # colonnes ni d'alignement pandas pour une seule ligne.
+            ri = int(hits[0])
+            df.iloc[ri] = row_vals
         else:
-            df = pd.concat([df, pd.DataFrame([new])], ignore_index=True)
-        target = save_data(df)
+            # Ajout en place : pas de recopie complète du journal à chaque sauvegarde.
+            ri = len(df)
+            df.loc[ri] = row_vals
+        target = save_data(df, row_idx=ri, is_new=not hits.size)
         st.success(f"✅ Données sauvegardées dans {target.upper()} ({len(df)} lignes)")
 
 # --------------------- Vue semainier ---------------------
 st.markdown("---")
 st.subheader("🗓️ Vue semainier (6h → 24h)")
 
-def build_week_plot(df: pd.DataFrame, pick: date):
+# Colonnes HH:MM utilisées par le semainier, parsées en une passe vectorisée.
+TIME_COLS = [
+    "travail_debut", "pause_dej", "reprise_aprem", "fin_travail",
+    "heure_sport", "prise_8h", "prise_13h", "prise_16h",
+]
+
+# Géométrie fixe du semainier, calculée une fois pour toutes.
+_X_TICKS = [i + 0.5 for i in range(7)]
+_Y_TICKS = range(6, 25, 2)
+_Y_TICKLABELS = [f"{h:02d}:00" for h in _Y_TICKS]
+_GRID_V = [((x, 6), (x, 24)) for x in range(8)]
+_GRID_H = [((0, y), (7, y)) for y in range(6, 25)]
+
+def _setup_week_axes(ax, labels, title):
+    mpl = _mpl()
+    ax.set_xlim(0, 7); ax.set_ylim(6, 24); ax.invert_yaxis()
+    ax.set_xticks(_X_TICKS); ax.set_xticklabels(labels)
+    ax.set_yticks(_Y_TICKS); ax.set_yticklabels(_Y_TICKLABELS)
+    # Deux artistes pour toute la grille, au lieu de 27 Line2D individuelles.
+    ax.add_collection(mpl.LineCollection(_GRID_V, colors="C0", linestyles="--", alpha=0.25))
+    ax.add_collection(mpl.LineCollection(_GRID_H, colors="C0", linestyles=":", alpha=0.07))
+    ax.set_title(title)
+
+def build_week_plot(wdf: pd.DataFrame, pick: date):
     days = week_days_for(pick)
     labels = [d.strftime("%a %d/%m") for d in days]
-    week_dates = [str(d) for d in days]
-    wdf = df[df["date"].isin(week_dates)].copy().sort_values("date")
 
-    fig, ax = plt.subplots(figsize=(16, 9))
-    ax.set_xlim(0, 7); ax.set_ylim(6, 24); ax.invert_yaxis()
-    ax.set_xticks([i + 0.5 for i in range(7)]); ax.set_xticklabels(labels)
-    ax.set_yticks(range(6, 25, 2)); ax.set_yticklabels([f"{h:02d}:00" for h in range(6, 25, 2)])
-    for x in range(8): ax.axvline(x, linestyle="--", alpha=0.25)
-    for y in range(6, 25): ax.axhline(y, linestyle=":", alpha=0.07)
-    ax.set_title(f"Semaine du {days[0].strftime('%d/%m/%Y')} au {days[-1].strftime('%d/%m/%Y')}")
+    mpl = _mpl()
+    # ~1080 px de large : inutile de rastériser plus fin que la colonne
+    # Streamlit qui affichera le PNG.
+    fig, ax = mpl.plt.subplots(figsize=(12, 6.75), dpi=90)
+    _setup_week_axes(ax, labels,
+                     f"Semaine du {days[0].strftime('%d/%m/%Y')} au {days[-1].strftime('%d/%m/%Y')}")
+
+    patches, facecolors = [], []
+    # Dictionnaire jour -> enregistrement construit une fois : accès O(1) en C,
+    # au lieu de sept scans booléens du slice hebdomadaire. Les heures HH:MM
+    # sont parsées colonne par colonne en amont (clés « *_h ») plutôt que
+    # champ par champ dans la boucle.
+    hrs = {c: _hhmm_series_to_hours(wdf[c]) for c in TIME_COLS}
+    spd = parse_duration_series(wdf["duree_sport"]).to_numpy()
+    by_day = {}
+    for i, (ts, rec) in enumerate(zip(wdf["date"], wdf.to_dict("records"))):
+        for c in TIME_COLS:
+            rec[c + "_h"] = hrs[c][i]
+        rec["duree_sport_h"] = spd[i]
+        by_day[ts] = rec
 
     for day_idx, the_day in enumerate(days):
-        row = wdf[wdf["date"] == str(the_day)]
-        if row.empty: 
+        row = by_day.get(pd.Timestamp(the_day))
+        if row is None:
             continue
-        row = row.iloc[0]
-
-        def to_h(x): return hhmm_to_hour(x) if isinstance(x, str) else np.nan
 
         # Travail rouge
-        wm, wl = to_h(row.get("travail_debut")), to_h(row.get("pause_dej"))
+        wm, wl = row["travail_debut_h"], row["pause_dej_h"]
         last_end = np.nan
-        if not np.isnan(wm) and not np.isnan(wl) and wl > wm:
-            draw_block(ax, day_idx, wm, wl, "red", "Travail matin")
+        if wm == wm and wl == wl and wl > wm:
+            draw_block(ax, patches, facecolors, day_idx, wm, wl, "red", "Travail matin")
             last_end = wl
-        if str(row.get("travail_aprem")).lower() in ["true", "1", "yes"]:
-            wa, we = to_h(row.get("reprise_aprem")), to_h(row.get("fin_travail"))
-            if not np.isnan(wa) and not np.isnan(we) and we > wa:
-                draw_block(ax, day_idx, wa, we, "red", "Travail AM")
-                last_end = max(last_end, we) if not np.isnan(last_end) else we
+        if row.get("travail_aprem"):
+            wa, we = row["reprise_aprem_h"], row["fin_travail_h"]
+            if wa == wa and we == we and we > wa:
+                draw_block(ax, patches, facecolors, day_idx, wa, we, "red", "Travail AM")
+                last_end = max(last_end, we) if last_end == last_end else we
         try:
-            if not np.isnan(last_end):
+            if last_end == last_end:
                 pts = int(float(row.get("nb_patients") or 0))
                 news = int(float(row.get("nouveaux_patients") or 0))
                 ax.text(day_idx + 0.06, min(23.0, last_end + 0.6),
@@ -319,32 +580,17 @@ def build_week_plot(df: pd.DataFrame, pick: date):
             pass
 
         # Sport vert
-        if str(row.get("sport")).lower() in ["true", "1", "yes"]:
-            starth = to_h(row.get("heure_sport"))
-            dur = 1.0
-            ds = str(row.get("duree_sport") or "").lower()
-            if "h" in ds or "min" in ds:
-                try:
-                    hh, mm = 0, 0
-                    if "h" in ds:
-                        hh = int(ds.split("h")[0].strip())
-                        rest = ds.split("h")[1]
-                        if "min" in rest:
-                            mm = int(rest.split("min")[0].strip())
-                    elif "min" in ds:
-                        mm = int(ds.split("min")[0].strip())
-                    dur = hh + mm / 60
-                except:
-                    pass
-            if not np.isnan(starth):
-                label = row.get("type_sport","sport")
-                if isinstance(label,str) and len(label)>14: label = label[:14]+"…"
-                draw_block(ax, day_idx, starth, starth + dur, "green", label)
+        if row.get("sport"):
+            starth = row["heure_sport_h"]
+            dur = row["duree_sport_h"] if row["duree_sport_h"] > 0 else 1.0
+            if starth == starth:
+                label = row["type_sport"] or "sport"
+                if len(label) > 14: label = label[:14]+"…"
+                draw_block(ax, patches, facecolors, day_idx, starth, starth + dur, "green", label)
 
         # Prises bleues
         for tcol, dcol in [("prise_8h", "dose_8h"), ("prise_13h", "dose_13h"), ("prise_16h", "dose_16h")]:
-            hv = hhmm_to_hour(row.get(tcol)) if isinstance(row.get(tcol), str) else np.nan
-            draw_med(ax, day_idx, hv, row.get(dcol))
+            draw_med(ax, patches, facecolors, day_idx, row[tcol + "_h"], row.get(dcol))
 
         # Bandeau récap bas de journée
         sleep_h = parse_duration_hmin(row.get("duree_sommeil"))
@@ -352,27 +598,49 @@ def build_week_plot(df: pd.DataFrame, pick: date):
         hw = hours_worked(row)
         hw_txt = f"⏱️ {hw:.1f} h" if pd.notnull(hw) else "⏱️ 0 h"
         d_txt = f"💪 {int(row.get('journee_durete'))}/10" if pd.notnull(row.get("journee_durete")) else "💪 n/d"
-        ei = " | ".join([str(row.get("effets_matin") or ""), str(row.get("effets_apresmidi") or ""), str(row.get("effets_soir") or "")]).strip()
+        ei = " | ".join([row["effets_matin"], row["effets_apresmidi"], row["effets_soir"]]).strip()
         ei = ei.replace("  "," ").strip(" |")
         if len(ei) > 40: ei = ei[:40] + "…"
         ei_txt = f"⚠️ {ei}" if ei else "⚠️ —"
-        com = str(row.get("commentaire") or "").strip()
+        com = row["commentaire"].strip()
         if len(com) > 50: com = com[:50] + "…"
         com_txt = f"📝 {com}" if com else "📝 —"
 
-        base_y = 23.8
-        ax.text(day_idx + 0.06, base_y, sleep_txt + "   " + hw_txt + "   " + d_txt,
-                fontsize=8, va="top")
-        ax.text(day_idx + 0.06, base_y - 0.45, ei_txt, fontsize=8, va="top")
-        ax.text(day_idx + 0.06, base_y - 0.90, com_txt, fontsize=8, va="top")
+        # Un seul artiste texte multi-lignes par jour au lieu de trois.
+        banner = "\n".join((sleep_txt + "   " + hw_txt + "   " + d_txt, ei_txt, com_txt))
+        ax.text(day_idx + 0.06, 23.8, banner, fontsize=8, va="top", linespacing=1.4)
+
+    if patches:
+        ax.add_collection(mpl.PatchCollection(patches, facecolors=facecolors, edgecolors=facecolors))
 
     return fig
 
-pick = st.date_input("Choisir une date (affiche sa semaine)", value=date.today(), key="weekpick")
-if isinstance(pick, list) and pick:
-    pick = pick[0]
-fig = build_week_plot(df, pick)
-st.pyplot(fig)
+@st.cache_data(show_spinner=False, max_entries=16)
+def week_plot_png(wdf: pd.DataFrame, pick: date) -> bytes:
+    # Mémoïsé sur (lignes de la semaine, date choisie) : tant que rien ne change,
+    # matplotlib n'est pas rappelé et le PNG est resservi tel quel.
+    fig = build_week_plot(wdf, pick)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    _mpl().plt.close(fig)
+    return buf.getvalue()
+
+@st.fragment
+def week_panel(df: pd.DataFrame):
+    # Fragment : naviguer entre les semaines ne relance que ce bloc,
+    # pas le formulaire ni la section analyse.
+    pick = st.date_input("Choisir une date (affiche sa semaine)", value=date.today(), key="weekpick")
+    if isinstance(pick, list) and pick:
+        pick = pick[0]
+    days = week_days_for(pick)
+    wdf = df[df["date"].between(pd.Timestamp(days[0]), pd.Timestamp(days[-1]))]
+    if wdf.empty:
+        # Rien à tracer : on évite de construire (et rastériser) une figure vide.
+        st.info("Aucune donnée cette semaine.")
+    else:
+        st.image(week_plot_png(wdf, pick), use_container_width=True)
+
+week_panel(df)
 
 # --------------------- Analyse & Corrélations ---------------------
 st.markdown("---")
@@ -384,36 +652,46 @@ with col_a:
 with col_b:
     st.caption("Remplis bien les 3 efficacités (matin/apm/soir) pour une moyenne fiable.")
 
-if not df.empty:
-    dfa = df.copy()
-    dfa["date"] = pd.to_datetime(dfa["date"], errors="coerce")
-    dfa = dfa.sort_values("date").dropna(subset=["date"])
+def analysis_panel(df: pd.DataFrame, days_range: int):
     since = date.today() - timedelta(days=days_range)
-    dfa = dfa[dfa["date"] >= pd.to_datetime(since)]
+    dfa = df.dropna(subset=["date"]).sort_values("date")
+    # La colonne est triée : recherche binaire du début de période plutôt
+    # qu'un masque booléen sur toutes les lignes.
+    cut = np.searchsorted(dfa["date"].to_numpy(), pd.Timestamp(since).to_datetime64())
+    dfa = dfa.iloc[cut:]
+
+    # Moins de 3 jours remplis : toutes les corrélations sortiraient n/d,
+    # inutile de dérouler le pipeline (cas fréquent d'un journal tout neuf).
+    if len(dfa) < 3:
+        st.info("Pas assez de jours remplis sur la période (minimum 3) pour les corrélations.")
+        return
 
-    dfa["sleep_h"] = dfa["duree_sommeil"].apply(parse_duration_hmin)
-    dfa["work_h"] = dfa.apply(hours_worked, axis=1)
-    dfa["eff_avg"] = dfa.apply(avg_efficacy, axis=1)
+    dfa = compute_metrics(dfa)
 
     st.markdown("**Variables suivies (période sélectionnée)**")
     view_cols = ["date","sleep_h","work_h","nb_patients","nouveaux_patients","eff_avg","journee_durete"]
-    st.dataframe(dfa[view_cols].round(2))
-
-    def corr_pair(x, y):
-        x = pd.to_numeric(x, errors="coerce")
-        y = pd.to_numeric(y, errors="coerce")
-        m = x.notna() & y.notna()
-        if m.sum() < 3:
-            return np.nan
-        return np.corrcoef(x[m], y[m])[0,1]
-
-    corr_data = {
-        "Heures travaillées ↔ Efficacité": corr_pair(dfa["work_h"], dfa["eff_avg"]),
-        "Patients (total) ↔ Efficacité": corr_pair(dfa["nb_patients"], dfa["eff_avg"]),
-        "Nouveaux patients ↔ Efficacité": corr_pair(dfa["nouveaux_patients"], dfa["eff_avg"]),
-        "Sommeil (h) ↔ Efficacité": corr_pair(dfa["sleep_h"], dfa["eff_avg"]),
-        "Dureté ↔ Efficacité": corr_pair(dfa["journee_durete"], dfa["eff_avg"]),
+    # DateColumn : la colonne datetime64 interne s'affiche en AAAA-MM-JJ,
+    # comme les chaînes d'origine, sans copie formatée du frame.
+    st.dataframe(dfa[view_cols].round({c: 2 for c in view_cols if c != "date"}),
+                 column_config={"date": st.column_config.DateColumn(format="YYYY-MM-DD")})
+
+    corr_vars = {
+        "Heures travaillées ↔ Efficacité": "work_h",
+        "Patients (total) ↔ Efficacité": "nb_patients",
+        "Nouveaux patients ↔ Efficacité": "nouveaux_patients",
+        "Sommeil (h) ↔ Efficacité": "sleep_h",
+        "Dureté ↔ Efficacité": "journee_durete",
     }
+    # Une seule matrice masquée (6, N) et un seul corrcoef : les cinq r
+    # sortent de la dernière colonne, au lieu de cinq passes séparées.
+    M = np.vstack([
+        pd.to_numeric(dfa[c], errors="coerce").to_numpy(dtype="float64")
+        for c in [*corr_vars.values(), "eff_avg"]
+    ])
+    rs = np.ma.filled(np.ma.corrcoef(np.ma.masked_invalid(M))[:-1, -1], np.nan)
+    valid = ~np.isnan(M)
+    enough = (valid[:-1] & valid[-1]).sum(axis=1) >= 3
+    corr_data = {k: (rs[i] if enough[i] else np.nan) for i, k in enumerate(corr_vars)}
     corr_df = pd.DataFrame(
         [{"Relation": k, "r (≈ force & signe)": (f"{v:.2f}" if pd.notnull(v) else "n/d")} for k,v in corr_data.items()]
     )
@@ -421,22 +699,34 @@ if not df.empty:
     st.dataframe(corr_df, use_container_width=True)
 
     def scatter_with_fit(x, y, xlabel, ylabel, title):
+        # Altair : la spec part en JSON et le rendu se fait côté navigateur,
+        # pas de rasterisation matplotlib côté serveur pour ces nuages.
         x = pd.to_numeric(x, errors="coerce")
         y = pd.to_numeric(y, errors="coerce")
         m = x.notna() & y.notna()
         if m.sum() < 3:
-            st.info(f"Pas assez de points pour « {title} ».") 
+            st.info(f"Pas assez de points pour « {title} ».")
             return
         xv, yv = x[m].values, y[m].values
-        a, b = np.polyfit(xv, yv, 1)
-        r = np.corrcoef(xv, yv)[0,1]
-        fig2, ax2 = plt.subplots(figsize=(5.5, 4))
-        ax2.scatter(xv, yv)
+        # Régression degré 1 en forme close : pente, ordonnée et r partagent
+        # les mêmes sommes centrées, en une passe, sans LAPACK.
+        xm, ym = xv.mean(), yv.mean()
+        dx, dy = xv - xm, yv - ym
+        sxx, sxy, syy = (dx * dx).sum(), (dx * dy).sum(), (dy * dy).sum()
+        a = sxy / sxx if sxx else 0.0
+        b = ym - a * xm
+        r = sxy / np.sqrt(sxx * syy) if sxx and syy else np.nan
         xs = np.linspace(xv.min(), xv.max(), 50)
-        ax2.plot(xs, a*xs + b)
-        ax2.set_xlabel(xlabel); ax2.set_ylabel(ylabel)
-        ax2.set_title(f"{title}\nr = {r:.2f}")
-        st.pyplot(fig2)
+        pts = alt.Chart(pd.DataFrame({"x": xv, "y": yv})).mark_circle(size=60).encode(
+            x=alt.X("x", title=xlabel), y=alt.Y("y", title=ylabel)
+        )
+        fit = alt.Chart(pd.DataFrame({"x": xs, "y": a * xs + b})).mark_line().encode(
+            x="x", y="y"
+        )
+        st.altair_chart(
+            (pts + fit).properties(title=f"{title} — r = {r:.2f}", height=300),
+            use_container_width=True,
+        )
 
     c1, c2, c3 = st.columns(3)
     with c1:
@@ -445,9 +735,24 @@ if not df.empty:
         scatter_with_fit(dfa["nb_patients"], dfa["eff_avg"], "Patients (total)", "Efficacité moyenne (0-10)", "Patients ↔ Efficacité")
     with c3:
         scatter_with_fit(dfa["sleep_h"], dfa["eff_avg"], "Sommeil (h)", "Efficacité moyenne (0-10)", "Sommeil ↔ Efficacité")
-else:
+
+if df.empty:
     st.info("Pas encore de données pour analyser les corrélations.")
+else:
+    analysis_panel(df, days_range)
 
 st.markdown("---")
 st.subheader("📊 Données enregistrées")
-st.dataframe(df.sort_values("date"))
+# On n'expédie au navigateur que la fin du journal : sérialiser tout
+# l'historique en Arrow à chaque rerun croît linéairement avec les années.
+hist = df.sort_values("date")
+if len(hist) > 200 and not st.checkbox(f"Afficher tout l'historique ({len(hist)} jours)"):
+    hist = hist.tail(200)
+st.dataframe(hist, column_config={"date": st.column_config.DateColumn(format="YYYY-MM-DD")})
+if not df.empty:
+    st.download_button(
+        "⬇️ Exporter en CSV",
+        data=df.assign(date=df["date"].dt.strftime("%Y-%m-%d")).to_csv(index=False),
+        file_name="journal.csv",
+        mime="text/csv",
+    )